@@ -1,7 +1,11 @@
 import streamlit as st
 import cv2
 import time
-from sequencer import Sequencer
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from ultralytics import YOLO
+from sequencer import Sequencer, SequenceState, StateInfo, export_engine
+from capture import FrameGrabber, capture_in_use, configure_camera
 from streamlit_sortables import sort_items
 
 st.set_page_config(page_title="MedOrder", layout="wide")
@@ -15,7 +19,21 @@ DEFAULT_CONF = 0.25
 DEFAULT_IOU = 0.7
 DEFAULT_IMGSZ = 256
 DEFAULT_TOLERANCE = 20
+DEFAULT_TARGET_FPS = 30
+CAPTURE_WIDTH = 640
+CAPTURE_HEIGHT = 480
 ALERT_DURATION_SECONDS = 3.0
+JPEG_QUALITY = 75
+INFERENCE_BATCH = 2
+# dataset yaml with ~200 representative camera frames, set it to build an INT8 engine instead of FP16
+INT8_CALIB_DATA = None
+# torch.compile the .pt weights when no TensorRT/ONNX export is available, costs extra startup time.
+# CUDA graphs are recorded per input shape, so while compiled every batch is padded to INFERENCE_BATCH
+# (single frames cost a full batch); the warm-up uses square frames, so the first camera frames
+# still record once more for the camera's aspect ratio
+COMPILE_MODEL = False
+UI_FPS = 15
+FPS_SMOOTHING = 0.1
 
 ## initialize session state
 if "running" not in st.session_state:
@@ -37,6 +55,28 @@ PRESET_SEQUENCES = {
     "Long Run": ['Mybacin', 'Paracetamol', 'Eno', 'Paracetamol'],
 }
 
+# expensive resources survive reruns, only sliders and the tracking list change between runs
+@st.cache_resource
+def get_engine_path(model_path: str, imgsz: int, batch: int, int8_data: Optional[str] = None) -> str:
+    return export_engine(model_path, imgsz, batch, int8_data)
+
+# process-wide, so every session gets the same model, Sequencer serializes inference on it
+@st.cache_resource
+def get_model(model_path: str) -> YOLO:
+    return YOLO(model_path)
+
+@st.cache_resource
+def get_camera(source: int) -> cv2.VideoCapture:
+    return cv2.VideoCapture(source, cv2.CAP_DSHOW)
+
+# State emoji mapping
+STATE_EMOJI = {
+    SequenceState.IDLE: '⏸️',
+    SequenceState.TRACKING: '🔍',
+    SequenceState.VALIDATING: '⚠️',
+    SequenceState.COMPLETED: '✅'
+}
+
 # log download and stop
 def handle_stop_and_log(manual_reset: bool = False):
     if 'sequencer' in st.session_state and st.session_state.running:
@@ -55,46 +95,22 @@ def handle_stop_and_log(manual_reset: bool = False):
     elif st.session_state.running:
         st.session_state.running = False
 
-def update_alert_display(alert_placeholder, sequencer):
-    state_info = sequencer.get_state_info()
-    
+def update_alert_display(alert_placeholder, state_info: StateInfo):
     # Show error alert during VALIDATING state
-    if state_info['is_validating']:
-        # Extract the wrong item message
-        if ':' in sequencer.message:
-            error_detail = sequencer.message.split(':', 1)[1].strip()
-        else:
-            error_detail = sequencer.message
-        
-        alert_placeholder.error(f"🚨 **WRONG ITEM!** {error_detail}", icon="❌")
+    if state_info.is_validating:
+        alert_placeholder.error(f"🚨 **WRONG ITEM!** {state_info.error_detail}", icon="❌")
     else:
         alert_placeholder.empty()
 
 
-def format_status_message(sequencer) -> str:
-    state_info = sequencer.get_state_info()
-    state = state_info['state']
-    progress = state_info['progress']
-    active_count = state_info['active_objects']
-    
-    # State emoji mapping
-    state_emoji = {
-        'IDLE': '⏸️',
-        'TRACKING': '🔍',
-        'VALIDATING': '⚠️',
-        'WAIT_FOR_CLEAR': '✅'
-    }
-    
-    emoji = state_emoji.get(state, '❓')
+def format_status_message(state_info: StateInfo) -> str:
+    emoji = STATE_EMOJI.get(state_info.state, '❓')
     
-    # Build status message
-    status_parts = [
-        f"{emoji} **State:** {state}",
-        f"**Progress:** {progress}",
-        f"**Active Objects:** {active_count}"
-    ]
-    
-    return " | ".join(status_parts)
+    return (
+        f"{emoji} **State:** {state_info.state.name} | "
+        f"**Progress:** {state_info.progress} | "
+        f"**Active Objects:** {state_info.active_objects}"
+    )
 
 # Layout
 col1, col2 = st.columns([1, 1])
@@ -130,10 +146,14 @@ with col2:
     st.markdown("#### Active Sequence Sorting")
     st.caption("Drag and drop to adjust the order for the currently selected sequence.")
     
-    sorted_items = sort_items(st.session_state.tracking_list)
-    st.session_state.tracking_list = sorted_items
-    
-    st.write(sorted_items)
+    # the sortable widget is only live between runs, while streaming a static list is enough
+    if not st.session_state.running:
+        sorted_items = sort_items(st.session_state.tracking_list)
+        st.session_state.tracking_list = sorted_items
+        
+        st.write(sorted_items)
+    else:
+        st.markdown("\n".join(f"- {item}" for item in st.session_state.tracking_list))
     
     st.markdown("---")
     
@@ -155,6 +175,9 @@ with col2:
     imgsz = st.slider("Image Size", 128, 640, DEFAULT_IMGSZ, step=32, key='imgsz_slider')
     tolerance = st.slider("Border Tolerance (px)", 1, 20, DEFAULT_TOLERANCE, key='tol_slider')
     iou = st.slider("IoU Threshold", 0.0, 1.0, DEFAULT_IOU, key='iou_slider')
+    target_fps = st.slider("Target FPS", 1, 60, DEFAULT_TARGET_FPS, key='fps_slider')
+    use_tracker = st.checkbox("Use Tracker (ByteTrack)", value=False, key='tracker_checkbox',
+                              help="Slower, but keeps track IDs and ignores unconfirmed detections")
 
 # left column (camera)
 with col1:
@@ -171,14 +194,24 @@ with col1:
             st.session_state.last_log = None
             st.session_state.log_filename = None
             
+            model_path = get_engine_path(MODEL_PATH, imgsz, INFERENCE_BATCH, INT8_CALIB_DATA)
+            try:
+                model = get_model(model_path)
+            except FileNotFoundError:
+                model = None
+            
             # create new sequencer instance
             st.session_state.sequencer = Sequencer(
-                model_path=MODEL_PATH,
+                model_path=model_path,
                 tracking_list=st.session_state.tracking_list,
                 conf=conf,
                 iou=iou,
                 imgsz=imgsz,
-                tolerance=tolerance
+                tolerance=tolerance,
+                model=model,
+                batch=INFERENCE_BATCH,
+                compile_model=COMPILE_MODEL,
+                use_tracker=use_tracker
             )
             st.session_state.running = True
     
@@ -190,51 +223,119 @@ with col1:
 # main loop
 if st.session_state.running:
     # init camera    
-    cap = cv2.VideoCapture(SOURCE_INPUT, cv2.CAP_DSHOW)
+    cap = get_camera(SOURCE_INPUT)
 
     if not cap.isOpened():
         st.error("❌ Cannot access camera.")
         st.session_state.running = False
+        # don't keep a dead capture cached, retry on the next start
+        get_camera.clear()
+    elif capture_in_use(cap):
+        st.error("❌ Camera is still held by the previous run, please start again.")
+        st.session_state.running = False
+        # leave the capture to the stuck grab thread, the next start opens a fresh one
+        get_camera.clear()
     else:
-        fps_time = time.time()
+        configure_camera(cap, CAPTURE_WIDTH, CAPTURE_HEIGHT, st.session_state.sequencer.logger)
         
-        # Main processing loop
-        while st.session_state.running and cap.isOpened():
-            ret, frame = cap.read()
-            
-            if not ret:
-                status_text.warning("⚠️ Cannot grab frame. Camera stream ended.")
-                st.session_state.sequencer.logger.error("Stream capture failed/ended.")
-                handle_stop_and_log()
-                break
-            
-            # Process frame through sequencer
-            processed_frame, status_message = st.session_state.sequencer.process_frame(frame)
-            
-            # update alert display
-            update_alert_display(alert_placeholder, st.session_state.sequencer)
-            
-            # convert to RGB for Streamlit display
-            processed_frame_rgb = cv2.cvtColor(processed_frame, cv2.COLOR_BGR2RGB)
-            
-            # display frame
-            frame_window.image(processed_frame_rgb, channels="RGB", width='stretch')
-            
-            # update status with state information
-            formatted_status = format_status_message(st.session_state.sequencer)
-            status_text.markdown(f"### {formatted_status}")
-            
-            # calculate and display FPS
-            current_time = time.time()
-            fps = 1.0 / (current_time - fps_time) if (current_time - fps_time) > 0 else 0
-            st.session_state["fps"] = round(fps, 1)
-            fps_display.markdown(f"**FPS:** {st.session_state['fps']}")
-            fps_time = current_time
-
-            time.sleep(0.01)
+        # capture runs on its own thread, the loop only consumes the freshest frame
+        # the displayed result may still point into the previous batch, so the grabber must not recycle those buffers
+        grabber = FrameGrabber(cap, pool_size=2 * INFERENCE_BATCH)
+        # inference runs on a worker so the previous result is rendered while the next batch is processed
+        executor = ThreadPoolExecutor(max_workers=1)
+        pending = None
+        frame_budget = 1.0 / target_fps
+        # the UI is refreshed at most UI_FPS times per second, the sequencer still sees every frame
+        ui_interval = 1.0 / UI_FPS
+        last_ui = 0.0
+        last_status = None
+        fps_ema = 0.0
+        shown_fps = None
+        fps_time = time.perf_counter()
         
-        # Cleanup after loop exits
-        cap.release()
+        try:
+            # Main processing loop
+            while st.session_state.running and cap.isOpened():
+                loop_start = time.perf_counter()
+                
+                # wait for the batch in flight before retrieving new frames, so the model
+                # never gets frames that went stale while the previous inference ran
+                # if it isn't done yet the model is the bottleneck, so batch frames up to
+                # INFERENCE_BATCH for throughput, otherwise send single frames for latency
+                behind = pending is not None and not pending.done()
+                batch_size = INFERENCE_BATCH if behind else 1
+                result = pending.result() if pending is not None else None
+                
+                frames = []
+                while len(frames) < batch_size and st.session_state.running:
+                    frame = grabber.read()
+                    if frame is not None:
+                        frames.append(frame)
+                    elif not grabber.running:
+                        break
+                
+                if len(frames) < batch_size:
+                    if not grabber.running:
+                        status_text.warning("⚠️ Cannot grab frame. Camera stream ended.")
+                        st.session_state.sequencer.logger.error("Stream capture failed/ended.")
+                        handle_stop_and_log()
+                        if grabber.stop():
+                            cap.release()
+                        get_camera.clear()
+                    break
+                
+                # Process frames through sequencer, rendering the previous result meanwhile
+                pending = executor.submit(st.session_state.sequencer.process_frames, frames)
+                if result is None:
+                    continue
+                processed_frame, status_message, state_info = result
+                
+                # update alert display
+                update_alert_display(alert_placeholder, state_info)
+                
+                now = time.perf_counter()
+                refresh_ui = now - last_ui >= ui_interval
+                
+                if refresh_ui:
+                    last_ui = now
+                    # display frame as JPEG, much cheaper to encode and send than the default PNG
+                    ok, jpeg = cv2.imencode('.jpg', processed_frame, [int(cv2.IMWRITE_JPEG_QUALITY), JPEG_QUALITY])
+                    if ok:
+                        frame_window.image(jpeg.tobytes(), width='stretch')
+                    else:
+                        frame_window.image(processed_frame, channels="BGR", width='stretch')
+                    
+                    # update status with state information, skipping the write when nothing changed
+                    formatted_status = format_status_message(state_info)
+                    if formatted_status != last_status:
+                        status_text.markdown(f"### {formatted_status}")
+                        last_status = formatted_status
+                
+                # calculate and display FPS, smoothed so the widget isn't redrawn for jitter
+                current_time = time.perf_counter()
+                if current_time > fps_time:
+                    fps = len(frames) / (current_time - fps_time)
+                    fps_ema = fps if fps_ema == 0.0 else (1 - FPS_SMOOTHING) * fps_ema + FPS_SMOOTHING * fps
+                st.session_state["fps"] = round(fps_ema, 1)
+                if refresh_ui and (shown_fps is None or abs(fps_ema - shown_fps) > 0.5):
+                    fps_display.markdown(f"**FPS:** {st.session_state['fps']}")
+                    shown_fps = fps_ema
+                fps_time = current_time
+
+                # only sleep for whatever is left of the batch budget
+                batch_budget = len(frames) * frame_budget
+                elapsed = time.perf_counter() - loop_start
+                if elapsed < batch_budget:
+                    time.sleep(batch_budget - elapsed)
+        finally:
+            # Cleanup also runs when Streamlit interrupts the script on a rerun,
+            # the cached capture stays open for the next run
+            executor.shutdown(wait=True)
+            if not grabber.stop():
+                # the grab thread is blocked in the driver and still owns the capture, it is
+                # released once that thread exits, the next run opens a fresh one instead
+                st.session_state.sequencer.logger.warning("Capture thread did not stop, reopening the camera next run")
+                get_camera.clear()
 
         if 'sequencer' in st.session_state:
             del st.session_state.sequencer
@@ -0,0 +1,98 @@
+import cv2
+import numpy as np
+import logging
+import threading
+from typing import Dict, List, Optional
+
+# grab thread currently driving each capture, keyed by id(cap), the thread keeps cap alive so the id can't be reused
+_capture_threads: Dict[int, threading.Thread] = {}
+
+def configure_camera(
+    cap: cv2.VideoCapture,
+    width: int = 640,
+    height: int = 480,
+    logger: Optional[logging.Logger] = None
+):
+    # keep a single frame in the driver queue and ask for compressed MJPG at a low resolution,
+    # webcams rarely offer square modes like imgsz x imgsz and would fall back to their default
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+    cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+
+    if logger is not None:
+        fourcc = int(cap.get(cv2.CAP_PROP_FOURCC))
+        codec = "".join(chr((fourcc >> (8 * i)) & 0xFF) for i in range(4))
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        logger.info(f"Camera configured: {codec} {width}x{height}")
+
+def capture_in_use(cap: cv2.VideoCapture) -> bool:
+    # a grab thread from an earlier run that never finished stopping still owns the capture
+    thread = _capture_threads.get(id(cap))
+    return thread is not None and thread.is_alive()
+
+class FrameGrabber:
+    def __init__(self, cap: cv2.VideoCapture, pool_size: int = 2):
+        # grab/retrieve are not thread-safe, never let two grabbers drive the same capture
+        if capture_in_use(cap):
+            raise RuntimeError("Capture is still in use by a previous FrameGrabber")
+        self.cap = cap
+
+        # frames are decoded into a ring of reused buffers, so a reader may hold
+        # at most pool_size - 1 frames before the oldest one gets overwritten
+        self.pool: List[Optional[np.ndarray]] = [None] * pool_size
+        self.pool_index = 0
+
+        self.lock = threading.Condition()
+        self.latest: Optional[np.ndarray] = None
+        self.wanted = False
+        # running tells readers whether frames can still arrive, stop_event asks the thread to exit
+        self.running = True
+        self.stop_event = threading.Event()
+
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        _capture_threads[id(cap)] = self.thread
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            if not self.cap.grab():
+                break
+
+            # frames nobody is waiting for are dropped without being decoded
+            with self.lock:
+                wanted = self.wanted
+            if not wanted:
+                continue
+
+            ok, frame = self.cap.retrieve(self.pool[self.pool_index])
+            if not ok:
+                break
+            self.pool[self.pool_index] = frame
+            self.pool_index = (self.pool_index + 1) % len(self.pool)
+            with self.lock:
+                self.latest = frame
+                self.wanted = False
+                self.lock.notify()
+
+        # stream ended or stop requested, wake up any waiting reader
+        with self.lock:
+            self.running = False
+            self.lock.notify_all()
+
+    def read(self, timeout: float = 1.0) -> Optional[np.ndarray]:
+        # returns only frames that have not been read yet, None on timeout or once the stream ended
+        with self.lock:
+            if self.latest is None and self.running:
+                self.wanted = True
+                self.lock.wait(timeout)
+            frame = self.latest
+            self.latest = None
+        return frame
+
+    def stop(self, timeout: float = 1.0) -> bool:
+        # False when the thread is still blocked in the driver, the capture must not be reused then
+        self.stop_event.set()
+        self.thread.join(timeout=timeout)
+        return not self.thread.is_alive()
@@ -1,21 +1,162 @@
 import cv2
 import numpy as np
+import torch
 from ultralytics import YOLO
+from ultralytics.utils.plotting import colors
+from ultralytics.trackers.track import on_predict_start, on_predict_postprocess_end
 import logging
-from io import StringIO
+import os
+import threading
 import time
-from enum import Enum
-from typing import Tuple, Optional, List, Set
+from collections import deque
+from enum import IntEnum
+from typing import Tuple, Optional, List, Set, Dict, NamedTuple
 
-class SequenceState(Enum):
-    PREPARING = "PREPARING"
-    IDLE = "IDLE"
-    TRACKING = "TRACKING"
-    VALIDATING = "VALIDATING"
-    COMPLETED = "COMPLETED"
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+# when the .pt weights run on the GPU, input shapes are fixed by imgsz so cuDNN autotuning pays off,
+# and any FP32 matmuls left go through TF32 tensor cores
+if torch.cuda.is_available():
+    torch.set_float32_matmul_precision('high')
+    torch.backends.cudnn.benchmark = True
+
+class SequenceState(IntEnum):
+    PREPARING = 0
+    IDLE = 1
+    TRACKING = 2
+    VALIDATING = 3
+    COMPLETED = 4
+
+STATE_COLORS = {
+    SequenceState.PREPARING: (0, 255, 255),
+    SequenceState.IDLE: (200, 200, 200),
+    SequenceState.TRACKING: (0, 255, 0),
+    SequenceState.VALIDATING: (0, 0, 255),
+    SequenceState.COMPLETED: (255, 165, 0)
+}
+
+class StateInfo(NamedTuple):
+    state: SequenceState
+    progress: str
+    active_objects: int
+    message: str
+    is_validating: bool
+    validation_time_remaining: float
+    error_detail: str
+
+class DequeHandler(logging.Handler):
+    # keeps the newest records only, they are formatted when the log is downloaded
+    def __init__(self, maxlen: int = 2000):
+        super().__init__()
+        self.records: deque = deque(maxlen=maxlen)
+    
+    def emit(self, record: logging.LogRecord):
+        self.records.append(record)
+    
+    def get_content(self) -> str:
+        # emit() runs under the same lock, so the inference thread can't append mid-copy
+        with self.lock:
+            records = list(self.records)
+        return "".join(f"{self.format(record)}\n" for record in records)
+
+_model_locks_guard = threading.Lock()
+
+def _model_lock(model: YOLO) -> threading.RLock:
+    # cached models are shared by every Streamlit session, and Ultralytics predictors are not thread-safe
+    with _model_locks_guard:
+        lock = getattr(model, 'inference_lock', None)
+        if lock is None:
+            lock = model.inference_lock = threading.RLock()
+    return lock
+
+Detections = Tuple[np.ndarray, np.ndarray, np.ndarray, Optional[np.ndarray]]
+
+def _collides_border(
+    xyxy: np.ndarray, bx1: int, by1: int, bx2: int, by2: int, tol: int
+) -> np.ndarray:
+    # scalar loop over the boxes, only used when numba can compile it
+    mask = np.zeros(xyxy.shape[0], dtype=np.bool_)
+    for i in range(xyxy.shape[0]):
+        x1 = xyxy[i, 0]
+        y1 = xyxy[i, 1]
+        x2 = xyxy[i, 2]
+        y2 = xyxy[i, 3]
+        
+        if x1 > bx1 + tol and x2 < bx2 - tol and y1 > by1 + tol and y2 < by2 - tol:
+            continue
+        if min(x2, bx2) - max(x1, bx1) <= 0 or min(y2, by2) - max(y1, by1) <= 0:
+            continue
+        
+        mask[i] = (
+            abs(x1 - bx1) <= tol or 
+            abs(x2 - bx2) <= tol or 
+            abs(y1 - by1) <= tol or 
+            abs(y2 - by2) <= tol
+        )
+    return mask
+
+if njit is not None:
+    _collides_border = njit(cache=True, fastmath=True)(_collides_border)
+    # compile (or load from the cache) at import with the types used per frame, not on the first detection
+    _collides_border(np.zeros((1, 4), dtype=np.int32), 0, 0, 0, 0, 0)
+
+def _export(
+    model_path: str, export_path: str, export_format: str, imgsz: int, batch: int, **kwargs
+) -> Optional[str]:
+    if not os.path.exists(export_path):
+        try:
+            exported = YOLO(model_path).export(
+                format=export_format,
+                imgsz=imgsz,
+                half=True,
+                dynamic=batch > 1,
+                batch=batch,
+                device=0,
+                **kwargs
+            )
+            os.replace(exported, export_path)
+        except Exception:
+            # the caller falls back to a slower format, make it visible why
+            logging.getLogger(__name__).exception(f"{export_format} export of {model_path} failed")
+            return None
+    return export_path
+
+def export_engine(model_path: str, imgsz: int, batch: int = 1, int8_data: Optional[str] = None) -> str:
+    # TensorRT needs an NVIDIA GPU, otherwise keep running the given weights
+    if model_path.endswith(('.engine', '.onnx')) or not torch.cuda.is_available():
+        return model_path
+    
+    # every export below would fail on missing weights, loading them reports the error instead
+    if not os.path.exists(model_path):
+        logging.getLogger(__name__).warning(f"Weights not found at {model_path}, skipping export")
+        return model_path
+    
+    # exports are built for a fixed input size and batch, so keep one per combination next to the weights
+    stem = f"{os.path.splitext(model_path)[0]}_{imgsz}_b{batch}"
+    
+    # INT8 needs a dataset yaml with representative frames for calibration, FP16 stays the default
+    if int8_data is not None:
+        int8_path = _export(model_path, f"{stem}_int8.engine", 'engine', imgsz, batch, int8=True, data=int8_data)
+        if int8_path is not None:
+            return int8_path
+    
+    engine_path = _export(model_path, f"{stem}.engine", 'engine', imgsz, batch)
+    if engine_path is not None:
+        return engine_path
+    
+    # without a working TensorRT install, ONNX Runtime on the GPU still avoids the PyTorch eager overhead
+    onnx_path = _export(model_path, f"{stem}.onnx", 'onnx', imgsz, batch, simplify=True)
+    return onnx_path if onnx_path is not None else model_path
 
 class Sequencer:
     VALIDATION_DISPLAY_DURATION = 3.0
+    STATIC_SCENE_THRESHOLD = 2.0
+    WARMUP_RUNS = 3
+    DEBUG_LOG_INTERVAL = 1.0
+    BORDER_CONFIRM_FRAMES = 2
     
     def __init__(
         self,
@@ -24,112 +165,235 @@ class Sequencer:
         conf: float = 0.25, 
         iou: float = 0.7, 
         imgsz: int = 256, 
-        tolerance: int = 10
+        tolerance: int = 10,
+        model: Optional[YOLO] = None,
+        device: Optional[str] = None,
+        half: Optional[bool] = None,
+        batch: int = 1,
+        use_tracker: bool = False,
+        int8_data: Optional[str] = None,
+        debug: bool = False,
+        compile_model: bool = False
     ):
         self.model_path = model_path
         self.tracking_list = tracking_list
+        # fixed for the whole run, so PREPARING only does the set difference per frame
+        self.required_items: Set[str] = set(tracking_list)
         self.conf = conf
         self.iou = iou
         self.imgsz = imgsz
         self.tolerance = tolerance
+        # FP16 on the GPU whenever one is available
+        self.device = device or ('cuda' if torch.cuda.is_available() else 'cpu')
+        self.half = half if half is not None else self.device != 'cpu'
+        # largest number of frames handed to process_frames at once
+        self.batch = batch
+        # the sequence logic works on classes only, track ids are just drawn on the boxes
+        self.use_tracker = use_tracker
+        # calibration dataset yaml, builds an INT8 engine instead of FP16 when given
+        self.int8_data = int8_data
+        # torch.compile the eager weights, slow on the first calls so the warm-up pays for it
+        self.compile_model = compile_model
+        # route the per-pixel OpenCV work through the T-API when an OpenCL device exists
+        self.use_opencl = cv2.ocl.haveOpenCL()
+        cv2.ocl.setUseOpenCL(self.use_opencl)
+        self._clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+        # scratch buffers for _preprocess_frame, OpenCV reuses them as long as the frame size stays the same
+        self._lab_buf = None
+        self._enhanced_buf = None
+        # per-frame detection dumps are only built in debug mode and go to the console
+        self.debug = debug
         self.session_id = time.strftime("%Y%m%d_%H%M%S")
         
         self.current_state = SequenceState.PREPARING
         self.expected_index = 0
         
         self.classes_on_border_prev: Set[str] = set()
+        # consecutive frames each class has been seen on the border
+        self.border_streaks: Dict[str, int] = {}
         self.classes_in_frame: Set[str] = set()
         
         self.message = "Initializing..."
+        self.error_detail = ""
         self.last_event_type: Optional[str] = None
         self.validation_start_time = 0.0
         self.completion_start_time = 0.0
+        self._last_debug_log = 0.0
+        
+        # last inferred scene, reused while the camera sees no change
+        self._last_small: Optional[np.ndarray] = None
+        self._last_detections: Optional[Detections] = None
         
-        self.log_stream = StringIO()
+        self.log_handler = DequeHandler()
         self.logger = self._setup_logger()
+        self.model_lock = threading.RLock()
         
         try:
-            self.model = YOLO(self.model_path)
-            self.logger.info(f"Model loaded: {self.model_path}")
+            if model is None:
+                self.model_path = export_engine(self.model_path, self.imgsz, self.batch, self.int8_data)
+                model = YOLO(self.model_path)
+            self.model = model
+            # every Sequencer around the same model, from any session, takes the same lock
+            self.model_lock = _model_lock(self.model)
+            # index by class id without going through the names dict per detection
+            self.class_names = [self.model.names[i] for i in range(len(self.model.names))]
+            with self.model_lock:
+                # a pre-loaded model is shared across runs, so drop any tracks left from the previous run
+                self._reset_tracker()
+                self.logger.info(f"Model loaded: {self.model_path} (device={self.device}, half={self.half})")
+                self._warmup()
             self._transition_to(SequenceState.PREPARING, "System initialized")
         except FileNotFoundError:
             self.logger.error(f"Model file not found at {self.model_path}")
             self.model = None
     
+    def _warmup(self):
+        # the model is cached across runs, it stays warm as long as the input settings don't change
+        warmup_key = (self.imgsz, self.batch, self.device, self.half, self.compile_model)
+        if getattr(self.model, 'warmup_key', None) == warmup_key:
+            return
+        
+        # pay for CUDA context/cuDNN autotune here instead of on the first camera frame
+        # the first passes are the slow ones, a single call doesn't get through all of it
+        dummy = np.zeros((self.imgsz, self.imgsz, 3), dtype=np.uint8)
+        for i in range(self.WARMUP_RUNS):
+            self.model.predict(
+                [dummy] * self.batch,
+                batch=self.batch,
+                imgsz=self.imgsz,
+                device=self.device,
+                half=self.half,
+                verbose=False
+            )
+            # the predictor only exists after the first call, the remaining runs then pay for the compile
+            if i == 0 and self.compile_model:
+                self._compile()
+        self.model.warmup_key = warmup_key
+    
+    def _compile(self):
+        # compile the network the predictor's AutoBackend actually runs, Ultralytics fuses and
+        # unwraps YOLO.model when it builds the predictor, so compiling that one has no effect
+        backend = getattr(self.model.predictor, 'model', None)
+        net = getattr(backend, 'model', None)
+        # exported engines/ONNX are already graphs, and a shared model may have been compiled by an earlier run
+        if getattr(backend, 'pt', False) and isinstance(net, torch.nn.Module) and not hasattr(net, '_orig_mod'):
+            backend.model = torch.compile(net, mode='reduce-overhead')
+            self.logger.info("Model compiled with torch.compile")
+    
+    def _reset_tracker(self):
+        predictor = getattr(self.model, 'predictor', None)
+        if not self.use_tracker:
+            self._detach_tracker(predictor)
+        for tracker in getattr(predictor, 'trackers', []):
+            tracker.reset()
+    
+    def _detach_tracker(self, predictor):
+        # model.track() registers its callbacks on the model for good, and the predictor shares
+        # that dict, so a cached model used for tracking once would keep running the tracker
+        tracker_callbacks = (on_predict_start, on_predict_postprocess_end)
+        for event, callbacks in self.model.callbacks.items():
+            callbacks[:] = [cb for cb in callbacks if getattr(cb, 'func', cb) not in tracker_callbacks]
+        if predictor is not None and hasattr(predictor, 'trackers'):
+            del predictor.trackers
+    
     def _setup_logger(self) -> logging.Logger:
         logger = logging.getLogger(f"Sequencer_{self.session_id}")
-        logger.setLevel(logging.INFO)
+        logger.setLevel(logging.DEBUG if self.debug else logging.INFO)
         logger.propagate = False
         
         if logger.hasHandlers():
             logger.handlers.clear()
         
-        handler = logging.StreamHandler(self.log_stream)
         formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-        handler.setFormatter(formatter)
-        logger.addHandler(handler)
+        # the downloadable log is the run's audit trail, debug dumps would push its events out of the deque
+        self.log_handler.setLevel(logging.INFO)
+        self.log_handler.setFormatter(formatter)
+        logger.addHandler(self.log_handler)
+        
+        if self.debug:
+            debug_handler = logging.StreamHandler()
+            debug_handler.setLevel(logging.DEBUG)
+            debug_handler.setFormatter(formatter)
+            logger.addHandler(debug_handler)
         
         logger.info(f"--- STARTING NEW SEQUENCE: {', '.join(self.tracking_list)} ---")
         return logger
     
     def get_log_content(self) -> str:
-        return self.log_stream.getvalue()
+        return self.log_handler.get_content()
     
     def _transition_to(self, new_state: SequenceState, reason: str = ""):
         if self.current_state != new_state:
             old_state = self.current_state
             self.current_state = new_state
-            log_msg = f"State transition: {old_state.value} → {new_state.value}"
+            log_msg = f"State transition: {old_state.name} → {new_state.name}"
             if reason:
                 log_msg += f" ({reason})"
             self.logger.info(log_msg)
     
     def _preprocess_frame(self, frame: np.ndarray) -> np.ndarray:
-        lab = cv2.cvtColor(frame, cv2.COLOR_BGR2LAB)
-        l, a, b = cv2.split(lab)
+        src = cv2.UMat(frame) if self.use_opencl else frame
+        lab = self._lab_buf = cv2.cvtColor(src, cv2.COLOR_BGR2LAB, dst=self._lab_buf)
         
-        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-        l = clahe.apply(l)
-        enhanced = cv2.merge([l, a, b])
-        enhanced = cv2.cvtColor(enhanced, cv2.COLOR_LAB2BGR)
+        # equalize the L plane and write it straight back, no split/merge copies of a and b
+        l = self._clahe.apply(cv2.extractChannel(lab, 0))
+        cv2.insertChannel(l, lab, 0)
+        enhanced = self._enhanced_buf = cv2.cvtColor(lab, cv2.COLOR_LAB2BGR, dst=self._enhanced_buf)
         
         blurred = cv2.GaussianBlur(enhanced, (3, 3), 0)
-        return blurred
+        return blurred.get() if self.use_opencl else blurred
     
-    def _is_colliding_with_border(self, object_box: Tuple[int, int, int, int], border_box: Tuple[int, int, int, int]) -> bool:
-        x1, y1, x2, y2 = object_box
+    def _border_collisions(self, xyxy: np.ndarray, border_box: Tuple[int, int, int, int]) -> np.ndarray:
         bx1, by1, bx2, by2 = border_box
         tol = self.tolerance
         
-        completely_inside = (
-            x1 > bx1 + tol and 
-            x2 < bx2 - tol and 
-            y1 > by1 + tol and 
-            y2 < by2 - tol
-        )
-        if completely_inside:
-            return False
-            
-        overlap_x = max(0, min(x2, bx2) - max(x1, bx1))
-        overlap_y = max(0, min(y2, by2) - max(y1, by1))
-        has_overlap = overlap_x > 0 and overlap_y > 0
-        if not has_overlap:
-            return False
-            
-        touch_left = abs(x1 - bx1) <= tol
-        touch_right = abs(x2 - bx2) <= tol
-        touch_top = abs(y1 - by1) <= tol
-        touch_bottom = abs(y2 - by2) <= tol
+        # with only a few boxes per frame the compiled loop beats the NumPy call overhead
+        if njit is not None:
+            return _collides_border(xyxy, bx1, by1, bx2, by2, tol)
         
-        return touch_left or touch_right or touch_top or touch_bottom
+        # same test as a per-box check, evaluated for all (N, 4) boxes at once with
+        # column-wise compares and no per-edge temporaries
+        border = np.array(border_box)
+        inner = border + np.array([tol, tol, -tol, -tol])
+        
+        completely_inside = (xyxy[:, :2] > inner[:2]).all(axis=1) & (xyxy[:, 2:] < inner[2:]).all(axis=1)
+        overlap = np.minimum(xyxy[:, 2:], border[2:]) - np.maximum(xyxy[:, :2], border[:2])
+        has_overlap = (overlap > 0).all(axis=1)
+        touching = (np.abs(xyxy - border) <= tol).any(axis=1)
+        
+        return ~completely_inside & has_overlap & touching
+    
+    def process_frame(self, frame: np.ndarray) -> Tuple[np.ndarray, str, StateInfo]:
+        return self.process_frames([frame])
     
-    def process_frame(self, frame: np.ndarray) -> Tuple[np.ndarray, str]:
+    def process_frames(self, frames: List[np.ndarray]) -> Tuple[np.ndarray, str, StateInfo]:
+        with self.model_lock:
+            annotated_frame, display_message = self._run_frames(frames)
+        # snapshot the state together with the frame it belongs to
+        return annotated_frame, display_message, self.get_state_info()
+    
+    def _run_frames(self, frames: List[np.ndarray]) -> Tuple[np.ndarray, str]:
+        # frames go through the model as one batch in capture order, each one
+        # drives the state machine but only the latest one gets annotated
         self.last_event_type = None
         
         if self.model is None:
-            return frame, "Error: Model not loaded"
+            return frames[-1], "Error: Model not loaded"
+        
+        if self._is_static_scene(frames):
+            # still one state machine step per frame, so streaks and timers don't depend on the batch size
+            last_index = len(frames) - 1
+            for i, frame in enumerate(frames):
+                annotated_frame = frame if i == last_index else None
+                output = self._process_detections(self._last_detections, frame.shape[:2], annotated_frame)
+            return output
         
-        preprocessed = self._preprocess_frame(frame)
+        # shrink to the model input size first so the enhancement runs on imgsz pixels, not camera pixels
+        preprocessed = [self._preprocess_frame(self._resize_for_model(frame)) for frame in frames]
+        # CUDA graphs are recorded per input shape, so a compiled model always gets the warmed-up
+        # batch size, padded with the last frame, instead of re-recording for short batches
+        if self.compile_model and len(preprocessed) < self.batch:
+            preprocessed += [preprocessed[-1]] * (self.batch - len(preprocessed))
         # results = self.model(
         #     source=preprocessed,
         #     conf=self.conf,
@@ -140,49 +404,118 @@ class Sequencer:
         #     save=False
         # )
 
-        results = self.model.track(
+        inference_args = dict(
             source=preprocessed,
+            batch=len(preprocessed),
+            stream=True,
             conf=self.conf,
             iou=self.iou,
             imgsz=self.imgsz,
-            persist=True,
+            device=self.device,
+            half=self.half,
             verbose=False,
             show=False,
             save=False
         )
+        # plain detection skips the per-frame Kalman/association work of the Ultralytics trackers
+        if self.use_tracker:
+            results = self.model.track(persist=True, **inference_args)
+        else:
+            results = self.model.predict(**inference_args)
         
-        if not results:
-            return frame, self.get_display_message()
-            
-        r = results[0]
-        annotated_frame = r.plot()
-        
-        height, width, _ = annotated_frame.shape
+        output = frames[-1], self.get_display_message()
+        last_index = len(frames) - 1
+        for i, r in enumerate(results):
+            # results for padding are dropped, but the stream still has to run to the end
+            if i > last_index:
+                continue
+            # boxes are mapped back to camera pixels, so the border geometry is unaffected by the resize
+            scale = frames[i].shape[1] / r.orig_shape[1]
+            self._last_detections = self._extract_detections(r, scale)
+            # draw on the camera frame in place instead of the copy r.plot() makes
+            annotated_frame = frames[i] if i == last_index else None
+            output = self._process_detections(self._last_detections, frames[i].shape[:2], annotated_frame)
+        return output
+    
+    def _resize_for_model(self, frame: np.ndarray) -> np.ndarray:
+        height, width = frame.shape[:2]
+        ratio = self.imgsz / max(height, width)
+        if ratio >= 1.0:
+            return frame
+        size = (max(1, round(width * ratio)), max(1, round(height * ratio)))
+        return cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+    
+    def _is_static_scene(self, frames: List[np.ndarray]) -> bool:
+        # compare tiny grayscale thumbnails against the last frame that went through the model
+        smalls = [
+            cv2.cvtColor(cv2.resize(frame, (32, 32), interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+            for frame in frames
+        ]
+        static = self._last_small is not None and self._last_detections is not None and all(
+            cv2.absdiff(small, self._last_small).mean() < self.STATIC_SCENE_THRESHOLD for small in smalls
+        )
+        if not static:
+            self._last_small = smalls[-1]
+        return static
+    
+    def _extract_detections(self, r, scale: float = 1.0) -> Detections:
+        # one host transfer per attribute instead of one per box
+        if r.boxes is not None:
+            xyxy = (r.boxes.xyxy.cpu().numpy() * scale).astype(np.int32)
+            cls_ids = r.boxes.cls.cpu().numpy().astype(np.int32)
+            confs = r.boxes.conf.cpu().numpy()
+            track_ids = r.boxes.id.cpu().numpy().astype(np.int64) if r.boxes.id is not None else None
+        else:
+            xyxy = np.empty((0, 4), dtype=np.int32)
+            cls_ids = np.empty(0, dtype=np.int32)
+            confs = np.empty(0)
+            track_ids = None
+        return xyxy, cls_ids, confs, track_ids
+    
+    def _process_detections(
+        self,
+        detections: Detections,
+        shape: Tuple[int, int],
+        annotated_frame: Optional[np.ndarray] = None
+    ) -> Tuple[Optional[np.ndarray], str]:
+        xyxy, cls_ids, confs, track_ids = detections
+        height, width = shape
         margin = 20
         detect_box_xyxy = (margin, margin, width - margin, height - margin)
         
-        cv2.rectangle(annotated_frame, (margin, margin), (width - margin, height - margin), (0, 255, 0), 2)
+        if annotated_frame is not None:
+            self._draw_detections(annotated_frame, xyxy, cls_ids, confs, track_ids)
+            cv2.rectangle(annotated_frame, (margin, margin), (width - margin, height - margin), (0, 255, 0), 2)
         
         current_time = time.time()
-        classes_on_border_curr = set()
-        self.classes_in_frame = set()
         
-        if r.boxes is not None:
-            for box, cls_id in zip(r.boxes.xyxy, r.boxes.cls):
-                box_xyxy = box.cpu().numpy().astype(int)
-                class_name = self.model.names[int(cls_id)]
-                
-                self.classes_in_frame.add(class_name)
-                
-                if self._is_colliding_with_border(box_xyxy, detect_box_xyxy):
-                    classes_on_border_curr.add(class_name)
+        # even in debug mode, dump the detections at most once per DEBUG_LOG_INTERVAL
+        if self.logger.isEnabledFor(logging.DEBUG) and current_time - self._last_debug_log >= self.DEBUG_LOG_INTERVAL:
+            self._last_debug_log = current_time
+            self.logger.debug("Detections: " + ", ".join(
+                f"{self.class_names[cls_id]} {box}" for box, cls_id in zip(xyxy.tolist(), cls_ids.tolist())
+            ))
+        
+        # tolist() converts in C, iterating the arrays would box every element into a NumPy scalar
+        colliding = self._border_collisions(xyxy, detect_box_xyxy)
+        self.classes_in_frame = {self.class_names[cls_id] for cls_id in cls_ids.tolist()}
+        
+        # plain detection has no tracker gating, so a single-frame false positive must not count
+        # as a crossing, a class only counts once it stayed on the border for BORDER_CONFIRM_FRAMES
+        confirm_frames = 1 if self.use_tracker else self.BORDER_CONFIRM_FRAMES
+        self.border_streaks = {
+            name: self.border_streaks.get(name, 0) + 1
+            for name in {self.class_names[cls_id] for cls_id in cls_ids[colliding].tolist()}
+        }
+        classes_on_border_curr = {
+            name for name, frames in self.border_streaks.items() if frames >= confirm_frames
+        }
         
         if self.current_state == SequenceState.PREPARING:
             self.expected_index = 0
             self.completion_start_time = 0.0
             
-            required_items = set(self.tracking_list)
-            missing_items = required_items - self.classes_in_frame
+            missing_items = self.required_items - self.classes_in_frame
             
             if not missing_items:
                 self._transition_to(SequenceState.IDLE, "All items present")
@@ -197,7 +530,10 @@ class Sequencer:
             if current_time - self.completion_start_time > self.VALIDATION_DISPLAY_DURATION:
                 self.expected_index = 0
                 self.classes_on_border_prev.clear()
+                self.border_streaks.clear()
                 self.completion_start_time = 0.0
+                self._last_small = None
+                self._last_detections = None
                 self._transition_to(SequenceState.PREPARING, "Sequence finished, resetting")
             else:
                 self.message = "✓ SEQUENCE COMPLETE!"
@@ -232,7 +568,8 @@ class Sequencer:
                     else:
                         self.last_event_type = 'Wrong'
                         self.validation_start_time = current_time
-                        self.message = f"⚠ Warning: expected {expected_class}, got {class_name}"
+                        self.error_detail = f"expected {expected_class}, got {class_name}"
+                        self.message = f"⚠ Warning: {self.error_detail}"
                         self._transition_to(SequenceState.VALIDATING, f"Wrong item: {class_name}")
                         self.logger.warning(f"✗ WRONG: Expected {expected_class}, got {class_name}")
 
@@ -244,19 +581,26 @@ class Sequencer:
         self.classes_on_border_prev = classes_on_border_curr
         
         display_message = self.get_display_message()
-        self._draw_status(annotated_frame, display_message, height)
+        if annotated_frame is not None:
+            self._draw_status(annotated_frame, display_message, height)
         
         return annotated_frame, display_message
 
+    def _draw_detections(self, frame, xyxy, cls_ids, confs, track_ids):
+        # plain ints index the names list and feed OpenCV without per-element NumPy scalars
+        ids = track_ids.tolist() if track_ids is not None else None
+        for i, ((x1, y1, x2, y2), cls_id, conf) in enumerate(zip(xyxy.tolist(), cls_ids.tolist(), confs.tolist())):
+            color = colors(cls_id, True)
+            label = f"{self.class_names[cls_id]} {conf:.2f}"
+            if ids is not None:
+                label = f"id:{ids[i]} {label}"
+            
+            cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
+            cv2.putText(frame, label, (x1, max(y1 - 4, 12)),
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1, cv2.LINE_AA)
+
     def _draw_status(self, frame, message, height):
-        color_map = {
-            SequenceState.PREPARING: (0, 255, 255),
-            SequenceState.IDLE: (200, 200, 200),
-            SequenceState.TRACKING: (0, 255, 0),
-            SequenceState.VALIDATING: (0, 0, 255),
-            SequenceState.COMPLETED: (255, 165, 0)
-        }
-        color = color_map.get(self.current_state, (255, 255, 255))
+        color = STATE_COLORS.get(self.current_state, (255, 255, 255))
         
         cv2.putText(frame, message, (10, height - 10), 
                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2, cv2.LINE_AA)
@@ -275,12 +619,13 @@ class Sequencer:
                 return f"Ready. Next: {self.tracking_list[0]}"
             return "Ready"
 
-    def get_state_info(self) -> dict:
-        return {
-            'state': self.current_state.value,
-            'progress': f"{self.expected_index}/{len(self.tracking_list)}",
-            'active_objects': len(self.classes_in_frame),
-            'message': self.message,
-            'is_validating': self.current_state == SequenceState.VALIDATING,
-            'validation_time_remaining': 0
-        }
\ No newline at end of file
+    def get_state_info(self) -> StateInfo:
+        return StateInfo(
+            state=self.current_state,
+            progress=f"{self.expected_index}/{len(self.tracking_list)}",
+            active_objects=len(self.classes_in_frame),
+            message=self.message,
+            is_validating=self.current_state == SequenceState.VALIDATING,
+            validation_time_remaining=0,
+            error_detail=self.error_detail
+        )
\ No newline at end of file